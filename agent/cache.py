@@ -4,102 +4,194 @@ Caches query→response pairs so repeated/similar questions get instant
 answers without hitting the LLM or Tavily API again.
 
 Features:
-  - Normalizes queries (lowercase, strip whitespace/punctuation) for fuzzy matching
-  - TTL-based expiration (default: 1 hour)
+  - Normalizes queries (NFKC, lowercase, strip whitespace/punctuation) for fuzzy
+    matching, then hashes them to fixed-length keys
+  - TTL-based expiration (default: 1 hour), swept in bulk from an expiry queue
   - Max size limit with LRU eviction
-  - Thread-safe for concurrent requests
+  - Thread-safe for concurrent requests, with per-shard locks
   - Cache stats endpoint for monitoring
 """
 
+import functools
+import hashlib
+import itertools
 import re
 import time
 import threading
-from collections import OrderedDict
+import unicodedata
+from collections import deque
+
+# Precompiled patterns used by _normalize_cached
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_WS_RE = re.compile(r'\s+')
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_cached(query: str) -> str:
+    """Normalize a query into a fixed-length cache key.
+
+    Applies NFKC, lowercases, removes punctuation and collapses whitespace so that
+    'What programs does MUL offer?' == 'what programs does mul offer ?', then
+    hashes the result so long messages don't become long dict keys.
+    Memoized on the raw query, so duplicate submits skip the regex passes.
+    """
+    q = unicodedata.normalize("NFKC", query).lower()
+    q = _PUNCT_RE.sub('', q)      # remove punctuation
+    q = _WS_RE.sub(' ', q)        # collapse whitespace
+    q = q.strip()
+    return hashlib.blake2b(q.encode(), digest_size=16).hexdigest()
+
+
+# Aim for at least this many entries per shard so LRU order stays meaningful
+_MIN_SHARD_SIZE = 32
+
+
+class _Shard:
+    """One independently locked stripe of a ResponseCache."""
+
+    __slots__ = ("cache", "expiry", "generation", "max_size", "low_water", "lock", "hits", "misses")
+
+    def __init__(self, max_size: int):
+        # Plain dicts keep insertion order, so the first key is always the LRU one.
+        # Entries are (response, generation, original_query) tuples.
+        self.cache: dict[str, tuple[str, int, str]] = {}
+        # (expiry_monotonic, key, generation) in insertion order. The TTL is
+        # fixed, so expiries are non-decreasing and expired records sit at the front.
+        self.expiry: deque[tuple[float, str, int]] = deque()
+        self.generation = 0
+        self.max_size = max_size
+        # Evict down to 90% when full so the next puts don't evict again
+        self.low_water = min(max_size, max(1, int(max_size * 0.9)))
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def sweep(self, now: float) -> None:
+        """Drop every entry whose TTL has passed. Caller must hold the lock.
+
+        Records left behind by overwritten or evicted keys carry an older
+        generation than the live entry and are simply discarded.
+        """
+        expiry = self.expiry
+        while expiry and expiry[0][0] < now:
+            _, key, generation = expiry.popleft()
+            entry = self.cache.get(key)
+            if entry is not None and entry[1] == generation:
+                del self.cache[key]
+
+    def get(self, key: str, now: float) -> str | None:
+        with self.lock:
+            self.sweep(now)
+            entry = self.cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            # Re-insert so the key moves to the end (most recently used)
+            del self.cache[key]
+            self.cache[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, response: str, query: str, expires_at: float, now: float) -> None:
+        cache = self.cache
+        with self.lock:
+            self.sweep(now)
+            self.generation += 1
+            generation = self.generation
+
+            # Update existing or insert new (always lands at the end)
+            cache.pop(key, None)
+            cache[key] = (response, generation, query)
+            self.expiry.append((expires_at, key, generation))
+
+            # Evict oldest down to the low-water mark if over capacity
+            if len(cache) > self.max_size:
+                stale = list(itertools.islice(cache, len(cache) - self.low_water))
+                for old_key in stale:
+                    del cache[old_key]
+
+            # Drop stale expiry records so the queue stays bounded by max_size
+            if len(self.expiry) > 2 * self.max_size:
+                self.expiry = deque(
+                    record for record in self.expiry
+                    if (entry := cache.get(record[1])) is not None and entry[1] == record[2]
+                )
+
+    def clear(self) -> None:
+        with self.lock:
+            self.cache.clear()
+            self.expiry.clear()
+            self.hits = 0
+            self.misses = 0
 
 
 class ResponseCache:
-    """In-memory LRU cache with TTL for chatbot responses."""
+    """In-memory LRU cache with TTL for chatbot responses.
 
-    def __init__(self, max_size: int = 500, ttl_seconds: int = 3600):
+    Keys are spread over independently locked shards so concurrent requests
+    rarely contend; LRU eviction is per shard.
+    """
+
+    def __init__(self, max_size: int = 500, ttl_seconds: int = 3600, num_shards: int = 16):
         """
         Args:
             max_size: Maximum number of cached entries (LRU eviction).
             ttl_seconds: Time-to-live for each entry in seconds (default: 1 hour).
+            num_shards: Upper bound on lock stripes. Rounded down to a power of
+                two (keys are routed with a bit mask), then halved until each
+                shard holds at least _MIN_SHARD_SIZE entries.
         """
-        self._cache: OrderedDict[str, dict] = OrderedDict()
+        num_shards = 1 << (max(1, num_shards).bit_length() - 1)
+        while num_shards > 1 and max_size // num_shards < _MIN_SHARD_SIZE:
+            num_shards //= 2
+        # Spread the remainder so the shard capacities add up to max_size
+        base, extra = divmod(max_size, num_shards)
+        self._shards = [_Shard(max(1, base + (i < extra))) for i in range(num_shards)]
+        self._shard_mask = num_shards - 1
         self._max_size = max_size
         self._ttl = ttl_seconds
-        self._lock = threading.Lock()
-        self._hits = 0
-        self._misses = 0
-
-    @staticmethod
-    def _normalize(query: str) -> str:
-        """Normalize a query for cache key matching.
-        
-        Lowercases, strips whitespace, removes punctuation so that
-        'What programs does MUL offer?' == 'what programs does mul offer'
-        """
-        q = query.lower().strip()
-        q = re.sub(r'[^\w\s]', '', q)      # remove punctuation
-        q = re.sub(r'\s+', ' ', q)          # collapse whitespace
-        return q
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) & self._shard_mask]
 
     def get(self, query: str) -> str | None:
         """Look up a cached response. Returns None on miss or expiry."""
-        key = self._normalize(query)
-        with self._lock:
-            entry = self._cache.get(key)
-            if entry is None:
-                self._misses += 1
-                return None
-
-            # Check TTL
-            if time.time() - entry["timestamp"] > self._ttl:
-                del self._cache[key]
-                self._misses += 1
-                return None
-
-            # Move to end (most recently used)
-            self._cache.move_to_end(key)
-            self._hits += 1
-            return entry["response"]
+        key = _normalize_cached(query)
+        return self._shard(key).get(key, time.monotonic())
 
     def put(self, query: str, response: str) -> None:
         """Store a query→response pair in the cache."""
-        key = self._normalize(query)
-        with self._lock:
-            # Update existing or insert new
-            self._cache[key] = {
-                "response": response,
-                "timestamp": time.time(),
-                "original_query": query,
-            }
-            self._cache.move_to_end(key)
-
-            # Evict oldest if over capacity
-            while len(self._cache) > self._max_size:
-                self._cache.popitem(last=False)
+        key = _normalize_cached(query)
+        now = time.monotonic()
+        self._shard(key).put(key, response, query, now + self._ttl, now)
 
     def stats(self) -> dict:
-        """Return cache statistics."""
-        with self._lock:
-            total = self._hits + self._misses
-            return {
-                "size": len(self._cache),
-                "max_size": self._max_size,
-                "ttl_seconds": self._ttl,
-                "hits": self._hits,
-                "misses": self._misses,
-                "hit_rate": f"{(self._hits / total * 100):.1f}%" if total > 0 else "0%",
-            }
+        """Return raw cache statistics (callers format them for display).
+
+        hit_rate is the fraction of lookups that were hits (0.0 when there
+        were none).
+        """
+        size = hits = misses = 0
+        for shard in self._shards:
+            with shard.lock:
+                size += len(shard.cache)
+                hits += shard.hits
+                misses += shard.misses
+        return {
+            "size": size,
+            "max_size": self._max_size,
+            "ttl_seconds": self._ttl,
+            "shards": len(self._shards),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
 
     def clear(self) -> None:
         """Clear all cached entries."""
-        with self._lock:
-            self._cache.clear()
-            self._hits = 0
-            self._misses = 0
+        for shard in self._shards:
+            shard.clear()
 
 
 # ── Singleton cache instance ────────────────────
@@ -29,6 +29,7 @@ def build_graph():
     
     Returns:
         Compiled LangGraph application with MemorySaver checkpointer.
+        The nodes are async, so drive it with ainvoke / astream.
     """
     # Create the state graph
     workflow = StateGraph(AgentState)
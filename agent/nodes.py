@@ -2,90 +2,220 @@
 
 Each function takes the AgentState and returns a partial state update.
 Nodes: route_query, web_search, generate, guardrail
+
+Nodes that call the LLM or Tavily are coroutines, so the compiled graph must be
+driven through its async API (ainvoke / astream).
 """
 
+import asyncio
+import logging
 import os
+import re
+import threading
 from datetime import datetime
 from tavily import TavilyClient
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, AIMessage
 from agent.state import AgentState
-from agent.prompts import ROUTER_PROMPT, GENERATOR_PROMPT, GUARDRAIL_RESPONSE
+from agent.cache import ResponseCache
+from agent.prompts import render_router_prompt, render_generator_prompt, GUARDRAIL_RESPONSE
+
+
+# Child of the app's "mul_chat" logger, so it shares its queued handler
+logger = logging.getLogger("mul_chat.nodes")
 
 
 # ── Lazy-initialized clients ────────────────────
 _llm = None
 _tavily_client = None
+_init_lock = threading.Lock()
+
+# Tavily results keyed by search query — 200 entries, 30-minute TTL
+_search_cache = ResponseCache(max_size=200, ttl_seconds=1800)
 
 
 def get_llm():
-    """Get or create the Gemini LLM instance (lazy init)."""
+    """Get or create the Gemini LLM instance (lazy init, thread-safe)."""
     global _llm
     if _llm is None:
-        _llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=os.getenv("GOOGLE_API_KEY"),
-            temperature=0.3,
-        )
+        with _init_lock:
+            if _llm is None:
+                _llm = ChatGoogleGenerativeAI(
+                    model="gemini-2.5-flash",
+                    google_api_key=os.getenv("GOOGLE_API_KEY"),
+                    temperature=0.3,
+                )
     return _llm
 
 
 def get_tavily():
-    """Get or create the Tavily client instance (lazy init)."""
+    """Get or create the Tavily client instance (lazy init, thread-safe)."""
     global _tavily_client
     if _tavily_client is None:
-        _tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+        with _init_lock:
+            if _tavily_client is None:
+                _tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
     return _tavily_client
 
 
+def _eager_init():
+    """Build both clients up front so the first request doesn't pay for it."""
+    get_llm()
+    get_tavily()
+
+
+# Optional warm-up on a background thread (set EAGER_INIT=1)
+if os.getenv("EAGER_INIT"):
+    threading.Thread(target=_eager_init, name="client-init", daemon=True).start()
+
+
+# ── Chat history rendering ──────────────────
+# State keeps the last _HISTORY_MAX_LINES rendered lines untrimmed; each node
+# then applies its own character budget when building its prompt, so a few
+# long answers can't bloat either prompt.
+_HISTORY_MAX_LINES = 10
+_GENERATE_HISTORY_BUDGET = 6000
+_ROUTER_HISTORY_BUDGET = 1500
+# The router only needs the gist of earlier answers; capping them keeps the
+# previous user turns inside its budget
+_ROUTER_AI_PREFIX = "Assistant: "
+_ROUTER_AI_MAX_CHARS = 300
+
+
+def _tail_by_budget(lines: list[str], budget: int) -> list[str]:
+    """Return the most recent lines whose combined length fits in budget.
+
+    The line that crosses the budget is cut down to the remaining space and
+    everything older is dropped, so one long line can use up the whole budget.
+    """
+    out = []
+    total = 0
+    for line in reversed(lines):
+        size = len(line)
+        if total + size > budget:
+            remaining = budget - total
+            if remaining > 0:
+                out.append(line[:remaining] + "...")
+            break
+        out.append(line)
+        total += size
+    out.reverse()
+    return out
+
+
+def _router_line(line: str) -> str:
+    """Truncate long assistant lines for the router prompt."""
+    limit = len(_ROUTER_AI_PREFIX) + _ROUTER_AI_MAX_CHARS
+    if len(line) > limit and line.startswith(_ROUTER_AI_PREFIX):
+        return line[:limit] + "..."
+    return line
+
+
+def _sync_history(state: AgentState) -> tuple[list[str], int]:
+    """Render only the messages added since the last node call.
+
+    Returns the updated, untrimmed history lines (the last _HISTORY_MAX_LINES)
+    and the message count they now cover.
+    """
+    messages = state.get("messages", [])
+    lines = state.get("history_lines") or []
+    upto = state.get("rendered_upto", 0)
+    if upto > len(messages):
+        # Messages were removed from the thread — start over
+        lines, upto = [], 0
+    if upto == len(messages):
+        return lines, upto
+
+    lines = list(lines)
+    for msg in messages[upto:]:
+        if isinstance(msg, HumanMessage):
+            lines.append(f"User: {msg.content}")
+        elif isinstance(msg, AIMessage):
+            lines.append(f"Assistant: {msg.content}")
+    return lines[-_HISTORY_MAX_LINES:], len(messages)
+
+
+# ── Pre-router for obvious cases ────────────
+# Standalone greetings / closings / acknowledgments → conversational
+_GREETING_RE = re.compile(
+    r"^\s*(?:hi|hello|hey|salam|salaam|assalam(?:u)?(?: o)? ?alaikum|assalam"
+    r"|good (?:morning|afternoon|evening|night)|thanks?(?: you)?(?: so much)?"
+    r"|bye|goodbye|ok(?:ay)?|great|i see)[\s!.,?]*$",
+    re.IGNORECASE,
+)
+# Short, whole-query topic lookups about the university → mul_related.
+# Anything longer or mixed (other tasks, injected instructions) goes to the LLM.
+_MUL_STRONG_RE = re.compile(
+    r"^\s*(?:(?:what|how much) (?:are|is) (?:the )?)?"
+    r"(?:admissions?|fees?|programs?|courses?|campus(?:es)?|scholarships?)"
+    r" (?:at|in|of) (?:mul|minhaj university)[\s!.,?]*$",
+    re.IGNORECASE,
+)
+
+
+def _pre_route(query: str) -> str | None:
+    """Classify high-confidence queries without the LLM. Returns None if unsure."""
+    if _GREETING_RE.match(query):
+        return "conversational"
+    if _MUL_STRONG_RE.match(query):
+        return "mul_related"
+    return None
+
+
 # ── Node: Route Query ─────────────────────────
-def route_query(state: AgentState) -> dict:
-    """Classify the user query as 'mul_related' or 'off_topic' using the LLM.
+async def route_query(state: AgentState) -> dict:
+    """Classify the user query as 'mul_related', 'conversational' or 'off_topic'.
     
-    Includes conversation history so follow-up questions are recognized properly.
+    Obvious greetings and explicit MUL questions are classified by regex; everything
+    else goes to the LLM with conversation history so follow-ups are recognized properly.
     """
     # Extract the latest user message
     messages = state.get("messages", [])
     query = ""
-    for msg in reversed(messages):
-        if isinstance(msg, HumanMessage):
-            query = msg.content
-            break
+    if messages and isinstance(messages[-1], HumanMessage):
+        # Common case: the turn was triggered by the message just appended
+        query = messages[-1].content
+    else:
+        for msg in reversed(messages):
+            if isinstance(msg, HumanMessage):
+                query = msg.content
+                break
 
     if not query:
         return {"query": "", "route": "off_topic"}
 
-    # Build chat history for context (last 6 messages before the current one)
-    chat_history_parts = []
-    history_messages = messages[:-1]  # exclude current message
-    recent = history_messages[-6:] if len(history_messages) > 6 else history_messages
-    for msg in recent:
-        if isinstance(msg, HumanMessage):
-            chat_history_parts.append(f"User: {msg.content}")
-        elif isinstance(msg, AIMessage):
-            # Truncate long AI responses for the router
-            content = msg.content[:150] + "..." if len(msg.content) > 150 else msg.content
-            chat_history_parts.append(f"Assistant: {content}")
-    chat_history = "\n".join(chat_history_parts) if chat_history_parts else "No previous conversation."
-
-    # Ask LLM to classify with conversation context
-    prompt = ROUTER_PROMPT.format(query=query, chat_history=chat_history)
-    response = get_llm().invoke([HumanMessage(content=prompt)])
-    route = response.content.strip().lower()
-
-    # Normalize the response
-    if "mul_related" in route:
-        route = "mul_related"
-    elif "conversational" in route:
-        route = "conversational"
-    else:
-        route = "off_topic"
+    history_lines, rendered_upto = _sync_history(state)
 
-    return {"query": query, "route": route, "search_results": ""}
+    route = _pre_route(query)
+    if route is None:
+        # Build chat history for context (messages before the current one, within budget)
+        router_lines = [_router_line(line) for line in history_lines[:-1]]  # exclude current message
+        recent = _tail_by_budget(router_lines, _ROUTER_HISTORY_BUDGET)
+        # Ask LLM to classify with conversation context
+        chat_history = "\n".join(recent) if recent else "No previous conversation."
+        prompt = render_router_prompt(chat_history=chat_history, query=query)
+        response = await get_llm().ainvoke([HumanMessage(content=prompt)])
+        route = response.content.strip().lower()
+
+        # Normalize the response
+        if "mul_related" in route:
+            route = "mul_related"
+        elif "conversational" in route:
+            route = "conversational"
+        else:
+            route = "off_topic"
+
+    return {
+        "query": query,
+        "route": route,
+        "search_results": "",
+        "history_lines": history_lines,
+        "rendered_upto": rendered_upto,
+    }
 
 
 # ── Node: Web Search ──────────────────────────
-def web_search(state: AgentState) -> dict:
+async def web_search(state: AgentState) -> dict:
     """Search the MUL official website using Tavily API.
     
     Restricted to mul.edu.pk domain only — no external results.
@@ -93,11 +223,18 @@ def web_search(state: AgentState) -> dict:
     query = state.get("query", "")
 
     current_year = datetime.now().year
+    search_query = f"Minhaj University Lahore {query} {current_year}"
+
+    cached = _search_cache.get(search_query)
+    if cached is not None:
+        return {"search_results": cached}
 
     try:
-        # Tavily search restricted to mul.edu.pk — prioritize recent results
-        results = get_tavily().search(
-            query=f"Minhaj University Lahore {query} {current_year}",
+        # Tavily search restricted to mul.edu.pk — prioritize recent results.
+        # The client is blocking, so run it off the event loop.
+        results = await asyncio.to_thread(
+            get_tavily().search,
+            query=search_query,
             search_depth="advanced",
             include_domains=["mul.edu.pk"],
             max_results=7,
@@ -105,62 +242,54 @@ def web_search(state: AgentState) -> dict:
         )
 
         # Format search results — include publication date if available
-        formatted_results = []
-        for i, result in enumerate(results.get("results", []), 1):
-            title = result.get("title", "No title")
-            content = result.get("content", "No content")
+        parts = []
+        for i, result in enumerate(results.get("results") or (), 1):
+            title = result.get("title") or "No title"
+            content = result.get("content") or "No content"
             url = result.get("url", "")
-            published = result.get("published_date", "")
+            published = result.get("published_date")
             date_str = f"Published: {published}\n" if published else ""
-            formatted_results.append(
-                f"**Source {i}: {title}**\n"
-                f"URL: {url}\n"
-                f"{date_str}"
-                f"Content: {content}\n"
-            )
+            parts.append(f"**Source {i}: {title}**\nURL: {url}\n{date_str}Content: {content}\n")
 
-        search_text = "\n---\n".join(formatted_results) if formatted_results else "No results found from mul.edu.pk"
+        search_text = "\n---\n".join(parts) if parts else "No results found from mul.edu.pk"
+        _search_cache.put(search_query, search_text)
 
     except Exception as e:
-        print(f"Tavily search error: {e}")
+        logger.warning("Tavily search error: %s", e)
         search_text = "Search temporarily unavailable. Please visit https://mul.edu.pk directly for the latest information."
 
     return {"search_results": search_text}
 
 
 # ── Node: Generate Response ───────────────────
-def generate(state: AgentState) -> dict:
+async def generate(state: AgentState) -> dict:
     """Generate the final response using search results and conversation history."""
     query = state.get("query", "")
     route = state.get("route", "mul_related")
     search_results = state.get("search_results", "")
-    messages = state.get("messages", [])
 
     # If conversational/memory-based, allow answering without search results
     if route == "conversational":
         search_results = "No external search performed. Answer based on Conversation History."
 
-    # Build chat history string from previous messages (last 10 messages)
-    chat_history_parts = []
-    recent_messages = messages[-10:] if len(messages) > 10 else messages
-    for msg in recent_messages:
-        if isinstance(msg, HumanMessage):
-            chat_history_parts.append(f"User: {msg.content}")
-        elif isinstance(msg, AIMessage):
-            chat_history_parts.append(f"Assistant: {msg.content}")
-    chat_history = "\n".join(chat_history_parts) if chat_history_parts else "No previous conversation."
+    # Build chat history string from previous messages (within budget)
+    history_lines, rendered_upto = _sync_history(state)
+    recent = _tail_by_budget(history_lines, _GENERATE_HISTORY_BUDGET)
+    chat_history = "\n".join(recent) if recent else "No previous conversation."
 
     # Generate response
-    prompt = GENERATOR_PROMPT.format(
+    prompt = render_generator_prompt(
         search_results=search_results,
         chat_history=chat_history,
         query=query,
     )
-    response = get_llm().invoke([HumanMessage(content=prompt)])
+    response = await get_llm().ainvoke([HumanMessage(content=prompt)])
 
     return {
         "response": response.content,
         "messages": [AIMessage(content=response.content)],
+        "history_lines": history_lines,
+        "rendered_upto": rendered_upto,
     }
 
 
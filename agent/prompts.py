@@ -94,3 +94,35 @@ I can assist you with:
 - 📞 **Contact Information**
 
 Feel free to ask me anything about MUL! 😊"""
+
+
+# ──────────────────────────────────────────────
+# Pre-split templates — filled with a single join per call
+# ──────────────────────────────────────────────
+def _split_template(template: str, *fields: str) -> tuple[str, ...]:
+    """Split a template into the literal chunks around each {field}, in order."""
+    parts = []
+    rest = template
+    for field in fields:
+        head, sep, rest = rest.partition("{" + field + "}")
+        if not sep:
+            raise ValueError(f"Placeholder {{{field}}} not found in template")
+        parts.append(head)
+    parts.append(rest)
+    return tuple(parts)
+
+
+_ROUTER_PARTS = _split_template(ROUTER_PROMPT, "chat_history", "query")
+_GENERATOR_PARTS = _split_template(GENERATOR_PROMPT, "search_results", "chat_history", "query")
+
+
+def render_router_prompt(chat_history: str, query: str) -> str:
+    """Equivalent to ROUTER_PROMPT.format(...) without reparsing the template."""
+    p = _ROUTER_PARTS
+    return "".join((p[0], chat_history, p[1], query, p[2]))
+
+
+def render_generator_prompt(search_results: str, chat_history: str, query: str) -> str:
+    """Equivalent to GENERATOR_PROMPT.format(...) without reparsing the template."""
+    p = _GENERATOR_PARTS
+    return "".join((p[0], search_results, p[1], chat_history, p[2], query, p[3]))
@@ -14,9 +14,15 @@ class AgentState(TypedDict):
         route: Classification result - 'mul_related' or 'off_topic'.
         search_results: Raw search results from Tavily web search.
         response: The final generated response text.
+        history_lines: Untrimmed "User: ..." / "Assistant: ..." lines for the most
+            recent messages, reused across turns so only new messages get rendered.
+            Each node applies its own character budget when building its prompt.
+        rendered_upto: Number of messages already rendered into history_lines.
     """
     messages: Annotated[Sequence[BaseMessage], add_messages]
     query: str
     route: str
     search_results: str
     response: str
+    history_lines: list[str]
+    rendered_upto: int
@@ -9,37 +9,171 @@ Endpoints:
     GET  /                 — Serve the frontend
 
 Security:
-    - Rate limiting: 20 requests/minute per IP (slowapi)
+    - Rate limiting: 20 requests/minute per IP per chat endpoint (ASGI middleware)
     - Input validation: max 1000 chars, non-empty
     - CORS: restricted to localhost in dev (update for production)
     - Error messages: sanitized, no internal details exposed
 """
 
 import os
+import time
+import hashlib
 import uuid
-import json
+import queue
+import logging
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import Annotated
+import orjson
 from dotenv import load_dotenv
 
 # Load environment variables BEFORE importing agent modules
 load_dotenv(override=True)
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import StreamingResponse
-from pydantic import BaseModel, field_validator
+from sse_starlette.sse import EventSourceResponse
+from pydantic import BaseModel, StringConstraints
 from langchain_core.messages import HumanMessage
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
 
 from agent.graph import graph
 from agent.cache import cache
 
 
+# ── Logging ──────────────────────────────────────
+# Records are handed to a queue and written by a background listener thread,
+# so error paths never block the event loop on a stderr write.
+logger = logging.getLogger("mul_chat")
+
+
+def _start_log_listener() -> tuple[QueueHandler, QueueListener]:
+    """Route the mul_chat logger through a QueueHandler and start its listener."""
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stderr_handler = logging.StreamHandler()
+    stderr_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
+
+    queue_handler = QueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    listener = QueueListener(log_queue, stderr_handler)
+    listener.start()
+    return queue_handler, listener
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    queue_handler, listener = _start_log_listener()
+    try:
+        yield
+    finally:
+        # Detach first so nothing is queued once the listener stops reading
+        logger.removeHandler(queue_handler)
+        logger.propagate = True
+        listener.stop()
+
+
 # ── Rate Limiter ─────────────────────────────────
-limiter = Limiter(key_func=get_remote_address)
+RATE_LIMIT = 20            # requests per window, per client IP and path
+RATE_LIMIT_PERIOD = 60     # window length in seconds
+RATE_LIMITED_PATHS = ("/api/chat", "/api/chat/stream")
+
+
+class RateLimitMiddleware:
+    """Fixed-window per-IP rate limiter applied at the ASGI boundary.
+
+    Throttled requests are answered with 429 before routing, so the endpoint
+    coroutine and body parsing never run. Counters live in memory and are
+    dropped wholesale when the window rolls over, which keeps them bounded.
+    """
+
+    def __init__(self, app, limit: int, period: int, paths: tuple[str, ...]):
+        self.app = app
+        self.limit = limit
+        self.period = period
+        self.paths = frozenset(paths)
+        self._window = 0
+        self._counts: dict[tuple[str, str], int] = {}
+        self._body = orjson.dumps({"error": f"Rate limit exceeded: {limit} per {period} seconds"})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        now = time.time()
+        window = int(now // self.period)
+        if window != self._window:
+            self._window = window
+            self._counts.clear()
+
+        client = scope.get("client")
+        key = (client[0] if client else "unknown", scope["path"])
+        count = self._counts.get(key, 0) + 1
+        self._counts[key] = count
+        if count <= self.limit:
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = int((window + 1) * self.period - now) + 1
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(self._body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": self._body})
+
+
+# Keep-alive comment interval so proxies don't drop idle streams during long generations
+SSE_PING_SECONDS = 15
+
+
+def _sse(obj) -> bytes:
+    """Encode one SSE data frame.
+
+    EventSourceResponse passes bytes through untouched, so frames are built
+    (and, where constant, cached) here rather than wrapped in ServerSentEvent.
+    """
+    return b"data: " + orjson.dumps(obj) + b"\n\n"
+
+
+# Fixed end-of-stream frame, encoded once
+_DONE = _sse({"type": "done"})
+
+
+# ── Stream fan-out ───────────────────────────────
+# Extra consumers of streamed responses (admin tap, logging, broadcast).
+# Contract: subscribers receive every pre-framed SSE frame sent to a client
+# on /api/chat/stream (status, response, done and error frames, cache hits
+# included) and must not re-serialize them. Callbacks run on the event loop;
+# exceptions they raise are logged and never reach the client stream.
+STREAM_SUBSCRIBERS: list[Callable[[bytes], None]] = []
+
+
+def _broadcast(frame: bytes) -> None:
+    """Hand an already-encoded frame to every stream subscriber."""
+    for subscriber in STREAM_SUBSCRIBERS:
+        try:
+            subscriber(frame)
+        except Exception:
+            logger.exception("Stream subscriber %r failed", subscriber)
+
+
+async def _fan_out(frames: AsyncIterator[bytes]):
+    """Yield frames to the client, sharing the same bytes with subscribers."""
+    async for frame in frames:
+        if STREAM_SUBSCRIBERS:
+            _broadcast(frame)
+        yield frame
 
 
 # ── Node status labels for streaming ─────────────
@@ -50,6 +184,18 @@ NODE_STATUS = {
     "guardrail":   {"icon": "🛡️", "text": "Preparing response..."},
 }
 
+# Status frames are constant, so encode them once at import
+NODE_STATUS_FRAMES = {
+    name: _sse({"type": "status", "icon": s["icon"], "text": s["text"], "node": name})
+    for name, s in NODE_STATUS.items()
+}
+_CACHE_STATUS_FRAME = _sse({
+    "type": "status",
+    "icon": "⚡",
+    "text": "Retrieved from cache...",
+    "node": "cache",
+})
+
 # ── Allowed origins (update for production domain) ─
 ALLOWED_ORIGINS = [
     "http://localhost:8000",
@@ -67,11 +213,17 @@ app = FastAPI(
     # Disable docs in production (set via env var)
     docs_url="/docs" if os.getenv("ENV", "development") != "production" else None,
     redoc_url=None,
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
-# Rate limit error handler
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# Rate limiting — added before CORS so 429s still carry CORS headers
+app.add_middleware(
+    RateLimitMiddleware,
+    limit=RATE_LIMIT,
+    period=RATE_LIMIT_PERIOD,
+    paths=RATE_LIMITED_PATHS,
+)
 
 # CORS middleware — restricted origins only
 app.add_middleware(
@@ -85,143 +237,114 @@ app.add_middleware(
 
 # ── Request / Response Models ────────────────────
 class ChatRequest(BaseModel):
-    message: str
+    # Stripped, non-empty, max 1000 chars — enforced inside pydantic-core
+    message: Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=1000)]
     thread_id: str | None = None
 
-    @field_validator("message")
-    @classmethod
-    def validate_message(cls, v: str) -> str:
-        v = v.strip()
-        if not v:
-            raise ValueError("Message cannot be empty")
-        if len(v) > 1000:
-            raise ValueError("Message too long (max 1000 characters)")
-        return v
-
 
 class ChatResponse(BaseModel):
+    """Shape of /api/chat responses (documentation only; the endpoint returns plain dicts)."""
     response: str
     thread_id: str
     cached: bool = False
 
 
+def _lookup_or_defer(body: ChatRequest) -> tuple[str, str | None]:
+    """Resolve the thread id and check the response cache in one step.
+
+    Returns (thread_id, cached_response); cached_response is None on a miss,
+    in which case the caller runs the graph and stores the result.
+    """
+    return body.thread_id or str(uuid.uuid4()), cache.get(body.message)
+
+
+# ── SSE generators ───────────────────────────────
+async def _cached_stream(thread_id: str, response_text: str):
+    """Replay a cached response as a cache-hit status, the response and done."""
+    yield _CACHE_STATUS_FRAME
+    yield _sse({
+        "type": "response",
+        "response": response_text,
+        "thread_id": thread_id,
+        "cached": True,
+    })
+    yield _DONE
+
+
+async def _event_stream(thread_id: str, message: str):
+    """Run the graph, streaming a status frame per node and the final response."""
+    try:
+        config = {"configurable": {"thread_id": thread_id}}
+        final_response = None
+
+        async for event in graph.astream(
+            {"messages": [HumanMessage(content=message)]},
+            config=config,
+            stream_mode="updates",
+        ):
+            # "updates" events normally hold a single node → output pair
+            for node_name, node_output in event.items():
+                frame = NODE_STATUS_FRAMES.get(node_name)
+                if frame:
+                    yield frame
+
+                response_text = node_output.get("response")
+                if response_text:
+                    final_response = response_text
+                    yield _sse({
+                        "type": "response",
+                        "response": final_response,
+                        "thread_id": thread_id,
+                    })
+
+        if final_response:
+            cache.put(message, final_response)
+
+        yield _DONE
+
+    except Exception:
+        # Log internally, never expose to client
+        logger.exception("Stream error for thread %s", thread_id, extra={"thread_id": thread_id})
+        yield _sse({
+            "type": "error",
+            "response": "I'm sorry, something went wrong. Please try again.",
+            "thread_id": thread_id,
+        })
+
+
 # ── Streaming Endpoint ───────────────────────────
 @app.post("/api/chat/stream")
-@limiter.limit("20/minute")
-async def chat_stream(request: Request, body: ChatRequest):
+async def chat_stream(body: ChatRequest):
     """Stream status updates and final response via SSE.
 
     Rate limited: 20 requests per minute per IP.
     If the response is cached, returns it instantly with a cache-hit status.
     """
-    thread_id = body.thread_id or str(uuid.uuid4())
-
     # ── Check cache first ────────────────────────
-    cached_response = cache.get(body.message)
+    thread_id, cached_response = _lookup_or_defer(body)
     if cached_response:
-        def cached_generator():
-            status_data = json.dumps({
-                "type": "status",
-                "icon": "⚡",
-                "text": "Retrieved from cache...",
-                "node": "cache",
-            })
-            yield f"data: {status_data}\n\n"
-
-            data = json.dumps({
-                "type": "response",
-                "response": cached_response,
-                "thread_id": thread_id,
-                "cached": True,
-            })
-            yield f"data: {data}\n\n"
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
-
-        return StreamingResponse(
-            cached_generator(),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "X-Accel-Buffering": "no",
-            },
-        )
+        frames = _cached_stream(thread_id, cached_response)
+    else:
+        # ── No cache hit — run the graph ─────────
+        frames = _event_stream(thread_id, body.message)
 
-    # ── No cache hit — run the graph ─────────────
-    def event_generator():
-        try:
-            config = {"configurable": {"thread_id": thread_id}}
-            final_response = None
-
-            for event in graph.stream(
-                {"messages": [HumanMessage(content=body.message)]},
-                config=config,
-                stream_mode="updates",
-            ):
-                for node_name in event:
-                    status = NODE_STATUS.get(node_name)
-                    if status:
-                        data = json.dumps({
-                            "type": "status",
-                            "icon": status["icon"],
-                            "text": status["text"],
-                            "node": node_name,
-                        })
-                        yield f"data: {data}\n\n"
-
-                    node_output = event[node_name]
-                    if "response" in node_output and node_output["response"]:
-                        final_response = node_output["response"]
-                        data = json.dumps({
-                            "type": "response",
-                            "response": final_response,
-                            "thread_id": thread_id,
-                        })
-                        yield f"data: {data}\n\n"
-
-            if final_response:
-                cache.put(body.message, final_response)
-
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
-
-        except Exception as e:
-            # Log internally, never expose to client
-            print(f"[ERROR] Stream error for thread {thread_id}: {e}")
-            error_data = json.dumps({
-                "type": "error",
-                "response": "I'm sorry, something went wrong. Please try again.",
-                "thread_id": thread_id,
-            })
-            yield f"data: {error_data}\n\n"
-
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-        },
-    )
+    return EventSourceResponse(_fan_out(frames), ping=SSE_PING_SECONDS)
 
 
 # ── Fallback non-streaming endpoint ─────────────
-@app.post("/api/chat", response_model=ChatResponse)
-@limiter.limit("20/minute")
-async def chat(request: Request, body: ChatRequest):
+@app.post("/api/chat", responses={200: {"model": ChatResponse}})
+async def chat(body: ChatRequest):
     """Process a user message and return the response.
 
     Rate limited: 20 requests per minute per IP.
     """
-    thread_id = body.thread_id or str(uuid.uuid4())
-
-    cached_response = cache.get(body.message)
+    thread_id, cached_response = _lookup_or_defer(body)
     if cached_response:
-        return ChatResponse(response=cached_response, thread_id=thread_id, cached=True)
+        return ORJSONResponse({"response": cached_response, "thread_id": thread_id, "cached": True})
 
     try:
         config = {"configurable": {"thread_id": thread_id}}
-        result = graph.invoke(
+        result = await graph.ainvoke(
             {"messages": [HumanMessage(content=body.message)]},
             config=config,
         )
@@ -231,10 +354,10 @@ async def chat(request: Request, body: ChatRequest):
             "I'm sorry, I couldn't process your request. Please try again."
         )
         cache.put(body.message, response_text)
-        return ChatResponse(response=response_text, thread_id=thread_id)
+        return ORJSONResponse({"response": response_text, "thread_id": thread_id, "cached": False})
 
-    except Exception as e:
-        print(f"[ERROR] Chat error for thread {thread_id}: {e}")
+    except Exception:
+        logger.exception("Chat error for thread %s", thread_id, extra={"thread_id": thread_id})
         raise HTTPException(
             status_code=500,
             detail="An error occurred while processing your message. Please try again.",
@@ -245,14 +368,16 @@ async def chat(request: Request, body: ChatRequest):
 @app.get("/api/cache/stats")
 async def cache_stats():
     """Return cache statistics for monitoring."""
-    return JSONResponse(content=cache.stats())
+    stats = cache.stats()
+    stats["hit_rate"] = f"{stats['hit_rate'] * 100:.1f}%"
+    return ORJSONResponse(content=stats)
 
 
 @app.post("/api/cache/clear")
 async def cache_clear():
     """Clear all cached entries (use when MUL website data is updated)."""
     cache.clear()
-    return JSONResponse(content={
+    return ORJSONResponse(content={
         "status": "cleared",
         "message": "Cache cleared. Next requests will fetch fresh data.",
     })
@@ -262,14 +387,22 @@ async def cache_clear():
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint."""
-    return JSONResponse(content={"status": "healthy", "service": "MUL Chatbot"})
+    return ORJSONResponse(content={"status": "healthy", "service": "MUL Chatbot"})
 
 
 # ── Serve Frontend Static Files ──────────────────
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# The landing page is read once and served from memory
+_INDEX_HTML = Path("static/index.html").read_bytes()
+_INDEX_ETAG = f'"{hashlib.md5(_INDEX_HTML).hexdigest()}"'
+_INDEX_HEADERS = {"Cache-Control": "public, max-age=300", "ETag": _INDEX_ETAG}
+_INDEX_RESPONSE = Response(content=_INDEX_HTML, media_type="text/html", headers=_INDEX_HEADERS)
+
 
 @app.get("/")
-async def serve_frontend():
-    """Serve the main chat UI."""
-    return FileResponse("static/index.html")
+async def serve_frontend(request: Request):
+    """Serve the main chat UI (304 if the client's copy is current)."""
+    if request.headers.get("if-none-match") == _INDEX_ETAG:
+        return Response(status_code=304, headers=_INDEX_HEADERS)
+    return _INDEX_RESPONSE